@@ -10,18 +10,20 @@ import pandas as pd
 import networkx as nx
 from networkx.readwrite import json_graph
 import os
+import hashlib
 import certifi
 
 from src.ingestion import extract_text_from_pdf
-from src.preprocess import split_sentences
 from src.nlp_pipeline import (
-    extract_entities_with_spans,
-    extract_relations_from_sentence,
-    naive_coref_resolution,
+    select_model,
+    split_sentence_docs,
+    parse_sentences,
+    extract_from_doc,
+    naive_coref_resolution_docs,
 )
 from src.embeddings import deduplicate_entities
-from src.graph_builder import build_graph_from_triplets
-from src.visualize import nx_to_pyvis
+from src.graph_builder import build_graph_from_triplets, normalize_triplets_frame
+from src.visualize import nx_to_pyvis_html
 
 # New: image generator (must create src/graph_image.py as provided earlier)
 from src.graph_image import graph_to_png_bytes
@@ -37,14 +39,54 @@ ocr = st.sidebar.checkbox("Enable OCR for scanned PDFs (requires system tesserac
 threshold = st.sidebar.slider("Deduplication similarity (%)", 50, 95, 80)
 preview_sentences = st.sidebar.number_input("Preview sentences", min_value=3, max_value=200, value=20)
 
+# Streamlit re-runs this script on every widget change; the expensive stages below are
+# memoized on the PDF's SHA-256 (underscore-prefixed args are not hashed by Streamlit),
+# so e.g. moving the threshold slider only re-runs deduplication onwards.
+# Entries are bounded per function and expire after an hour, since results for
+# large PDFs (page texts, sentences, entity lists) are held in server memory.
+_CACHE_TTL = 3600
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=_CACHE_TTL)
+def _extract_pages(pdf_hash: bytes, ocr: bool, _pdf_bytes: bytes):
+    return extract_text_from_pdf(_pdf_bytes, ocr_if_needed=ocr)
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=_CACHE_TTL)
+def _analyze_text(pdf_hash: bytes, ocr: bool, _pages: list):
+    # Long or mostly-OCR'd documents use the small spaCy model instead of the transformer
+    page_texts = [p["text"] for p in _pages]
+    nlp = select_model(
+        total_chars=sum(len(t) for t in page_texts),
+        num_pages=len(page_texts),
+        ocr_pages=sum(1 for p in _pages if p.get("ocr")),
+    )
+
+    # Sentences: parse each page once with spaCy and split on its sentence boundaries;
+    # the sentence docs are reused for coref and extraction
+    docs = split_sentence_docs(page_texts, nlp)
+    resolved = naive_coref_resolution_docs(docs)
+
+    # Only sentences rewritten by coref need a fresh parse
+    all_entities = []
+    triplets = []
+    for doc in parse_sentences(resolved, docs, nlp):
+        ents, rels = extract_from_doc(doc)
+        all_entities.extend(e["text"] for e in ents)
+        triplets.extend(rels)
+    return resolved, all_entities, triplets
+
+@st.cache_data(show_spinner=False, max_entries=8, ttl=_CACHE_TTL)
+def _deduplicate(entities: tuple, threshold: float):
+    return deduplicate_entities(list(entities), threshold=threshold)
+
 uploaded = st.file_uploader("Upload a PDF File", type=["pdf"])
 
 if uploaded:
     st.success("PDF uploaded - processing...")
-    pdf_bytes = uploaded.read()
+    pdf_bytes = uploaded.getvalue()
+    pdf_hash = hashlib.sha256(pdf_bytes).digest()
 
     with st.spinner("Extracting text..."):
-        pages = extract_text_from_pdf(pdf_bytes, ocr_if_needed=ocr)
+        pages = _extract_pages(pdf_hash, ocr, pdf_bytes)
 
     if not pages:
         st.error("No pages extracted from PDF.")
@@ -53,53 +95,29 @@ if uploaded:
     st.subheader("Extracted text (first page)")
     st.code(pages[0]["text"][:3000] or "No text on first page.")
 
-    # Sentences
-    sentences = []
-    for p in pages:
-        sentences.extend(split_sentences(p["text"]))
+    # Sentences, naive coref, entities and relations
+    with st.spinner("Parsing text, resolving pronouns and extracting entities & relations..."):
+        resolved, all_entities, triplets = _analyze_text(pdf_hash, ocr, pages)
 
-    st.info(f"Extracted {len(sentences)} sentences")
-
-    # Naive Coref
-    with st.spinner("Resolving pronouns (naive coref)..."):
-        resolved = naive_coref_resolution(sentences)
+    st.info(f"Extracted {len(resolved)} sentences")
 
     st.subheader("Sample sentences after coref")
     for s in resolved[:preview_sentences]:
         st.write("-", s)
 
-    # Entities and Relations
-    all_entities = []
-    triplets = []
-    with st.spinner("Extracting entities & relations..."):
-        for sent in resolved:
-            ents = extract_entities_with_spans(sent)
-            for e in ents:
-                all_entities.append(e["text"])
-            rels = extract_relations_from_sentence(sent)
-            for r in rels:
-                triplets.append(r)
-
     st.subheader("Entities (sample)")
     st.write(list(dict.fromkeys(all_entities))[:100])
 
     # Deduplicate Entities
     with st.spinner("Deduplicating entitites..."):
-        reps = deduplicate_entities(list(dict.fromkeys(all_entities)), threshold=threshold/100.0)
+        reps = _deduplicate(tuple(dict.fromkeys(all_entities)), threshold/100.0)
 
     st.subheader("Entity representative (sample)")
     st.write(reps[:100])
 
     # Normalize Triplets
-    def normalize(e: str) -> str:
-        if not e:
-            return e
-        for r in reps:
-            if e.lower() in r.lower() or r.lower() in e.lower():
-                return r
-        return e
-
-    normalized_triplets = [(normalize(s), p, normalize(o)) for (s, p, o) in triplets if s and o]
+    # Column-oriented (subject/predicate/object DataFrame), reused for the CSV download
+    normalized_triplets = normalize_triplets_frame(triplets, reps)
 
     st.info(f"Total triplets: {len(normalized_triplets)}")
 
@@ -117,65 +135,51 @@ if uploaded:
         st.warning("Graph is empty - try another document or enable OCR for scanned PDFs.")
     else:
         st.subheader("Interactive Graph")
-        html_path = None
+        # Generate interactive PyVis HTML (in memory, no temp file)
+        html = nx_to_pyvis_html(G)
+        st.components.v1.html(html, height=700, scrolling=True)
+
+        st.subheader("Download Options")
+        # HTML
+        st.download_button("Download graph HTML", data=html.encode("utf-8"), file_name="knowledge_graph.html", mime="text/html")
+
+        # JSON (node-link)
+        graph_json = json.dumps(json_graph.node_link_data(G), indent=2)
+        st.download_button("Download graph JSON", data=graph_json, file_name="knowledge_graph.json", mime="application/json")
+
+        # triplets CSV
+        if not normalized_triplets.empty:
+            st.download_button("Download triplets CSV", data=normalized_triplets.to_csv(index=False).encode("utf-8"), file_name="triplets.csv", mime="text/csv")
+
+        # --- NEW: generate PNG snapshot and display + download ---
         try:
-            # Generate interactive PyVis HTML
-            html_path = nx_to_pyvis(G)
-            with open(html_path, "r", encoding="utf-8") as fh:
-                html = fh.read()
-            st.components.v1.html(html, height=700, scrolling=True)
-
-            st.subheader("Download Options")
-            # HTML
-            with open(html_path, "rb") as fh:
-                st.download_button("Download graph HTML", data=fh, file_name="knowledge_graph.html", mime="text/html")
-
-            # JSON (node-link)
-            graph_json = json.dumps(json_graph.node_link_data(G), indent=2)
-            st.download_button("Download graph JSON", data=graph_json, file_name="knowledge_graph.json", mime="application/json")
-
-            # triplets CSV
-            if normalized_triplets:
-                df = pd.DataFrame(normalized_triplets, columns=["subject", "predicate", "object"])
-                st.download_button("Download triplets CSV", data=df.to_csv(index=False).encode("utf-8"), file_name="triplets.csv", mime="text/csv")
-
-            # --- NEW: generate PNG snapshot and display + download ---
-            try:
-                png_bytes = graph_to_png_bytes(G, figsize=(12, 12), dpi=200, layout="spring", font_size=8)
-                st.subheader("Static Image Snapshot of the Graph")
-                st.image(png_bytes, use_column_width=True)
-
-                st.download_button(
-                    label="Download graph as PNG",
-                    data=png_bytes,
-                    file_name="knowledge_graph.png",
-                    mime="image/png"
-                )
-            except Exception as e_img:
-                st.warning(f"Could not generate PNG snapshot: {e_img}")
-
-            # show small edge table (optional)
-            st.subheader("Graph edges (sample)")
-            edges_list = []
-            for u, v, d in G.edges(data=True):
-                edges_list.append({
-                    "source": u,
-                    "target": v,
-                    "label": d.get("label", ""),
-                    "weight": d.get("weight", 1),
-                    "preds": ",".join(d.get("preds", [])) if d.get("preds") else "",
-                })
-            if edges_list:
-                st.dataframe(pd.DataFrame(edges_list).head(200))
-            else:
-                st.info("No edges to show.")
-        finally:
-            # cleanup the temporary pyvis html file if created
-            if html_path:
-                try:
-                    import os
-                    os.remove(html_path)
-                except Exception:
-                    pass
+            png_bytes = graph_to_png_bytes(G, figsize=(12, 12), dpi=200, layout="spring", font_size=8)
+            st.subheader("Static Image Snapshot of the Graph")
+            st.image(png_bytes, use_column_width=True)
+
+            st.download_button(
+                label="Download graph as PNG",
+                data=png_bytes,
+                file_name="knowledge_graph.png",
+                mime="image/png"
+            )
+        except Exception as e_img:
+            st.warning(f"Could not generate PNG snapshot: {e_img}")
+
+        # show small edge table (optional)
+        st.subheader("Graph edges (sample)")
+        edges_list = []
+        for u, v, d in G.edges(data=True):
+            edges_list.append({
+                "source": u,
+                "target": v,
+                "label": d.get("label", ""),
+                "weight": d.get("weight", 1),
+                "preds": ",".join(d.get("preds", [])) if d.get("preds") else "",
+            })
+        if edges_list:
+            st.dataframe(pd.DataFrame(edges_list).head(200))
+        else:
+            st.info("No edges to show.")
 else:
     st.info("Please upload a PDF file to begin.")
@@ -0,0 +1,3 @@
+"""
+Pytest root marker: puts the repository root on sys.path so tests can import src.
+"""
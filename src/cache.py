@@ -0,0 +1,103 @@
+"""
+cache.py
+
+Small SQLite-backed content-hash cache shared by ingestion (OCR pages) and
+embeddings. Keys are SHA-256 digests of the inputs; values are raw bytes.
+The cache is best-effort: any SQLite or filesystem error (e.g. an unwritable
+cache directory) behaves like a miss, and failed writes are dropped.
+
+Entries carry a last-used timestamp; every write prunes the least recently
+used rows once the stored values exceed KG_CACHE_MAX_MB. Setting
+KG_CACHE_PATH=off disables the cache entirely.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional
+
+CACHE_PATH = os.environ.get(
+    "KG_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "kg_generator", "kg_cache.db"),
+)
+ENABLED = CACHE_PATH.strip().lower() not in ("", "off", "none", "0")
+MAX_BYTES = int(float(os.environ.get("KG_CACHE_MAX_MB", "512")) * 1024 * 1024)
+#SQLite's default limit on bound parameters is 999 on older builds
+_MAX_PARAMS = 900
+
+def make_key(*parts: bytes) -> bytes:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(len(p).to_bytes(8, "little"))
+        h.update(p)
+    return h.digest()
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    #Rows from the pre-eviction schema have no timestamp; drop them rather than migrate
+    conn.execute("DROP TABLE IF EXISTS cache")
+    conn.execute("CREATE TABLE IF NOT EXISTS entries(key BLOB PRIMARY KEY, val BLOB, ts REAL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_ts ON entries(ts)")
+    return conn
+
+def _prune(conn: sqlite3.Connection):
+    #Keep the most recently used rows whose running size fits under MAX_BYTES
+    conn.execute(
+        "DELETE FROM entries WHERE key IN ("
+        " SELECT key FROM (SELECT key, SUM(LENGTH(val)) OVER (ORDER BY ts DESC, key) AS used FROM entries)"
+        " WHERE used > ?)",
+        (MAX_BYTES,),
+    )
+
+def get(key: bytes) -> Optional[bytes]:
+    return get_many([key]).get(key)
+
+def put(key: bytes, val: bytes):
+    put_many({key: val})
+
+def get_many(keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+    keys = list(keys)
+    out = {}
+    if not keys or not ENABLED:
+        return out
+    try:
+        conn = _connect()
+        try:
+            now = time.time()
+            for start in range(0, len(keys), _MAX_PARAMS):
+                chunk = keys[start:start + _MAX_PARAMS]
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT key, val FROM entries WHERE key IN ({marks})", chunk)
+                hits = {bytes(k): bytes(v) for k, v in rows}
+                if hits:
+                    with conn:
+                        conn.execute(
+                            f"UPDATE entries SET ts = ? WHERE key IN ({','.join('?' * len(hits))})",
+                            [now, *hits],
+                        )
+                out.update(hits)
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        pass
+    return out
+
+def put_many(items: Dict[bytes, bytes]):
+    if not items or not ENABLED:
+        return
+    try:
+        conn = _connect()
+        try:
+            now = time.time()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries(key, val, ts) VALUES (?, ?, ?)",
+                    ((k, v, now) for k, v in items.items()),
+                )
+                _prune(conn)
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        pass
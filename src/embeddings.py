@@ -5,47 +5,283 @@ Wraps sentence-transformers model for embedding and deduplication.
 """
 from sentence_transformers import SentenceTransformer
 import numpy as np
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
 from typing import List
 
+from src import cache
+
+try:
+    import faiss
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+except Exception:
+    #faiss/scipy are optional; fall back to the blocked exact path
+    faiss = None
+
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+except Exception:
+    #optimum/onnxruntime are optional; fall back to the PyTorch SentenceTransformer
+    ORTModelForFeatureExtraction = None
+
+try:
+    from numba import njit, prange
+except Exception:
+    #numba is optional; only needed for method="numba" in deduplicate_entities
+    njit = None
+
 MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = "sentence-transformers/" + MODEL_NAME
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kg_generator", MODEL_NAME + "-int8")
+_SIM_BLOCK_BYTES = 64 * 1024 * 1024
+#Entity counts above which the FAISS neighbour-graph path (and HNSW) kick in
+_FAISS_MIN_ENTITIES = 1000
+_HNSW_MIN_ENTITIES = 10000
+_HNSW_NEIGHBOURS = 32
+#range_search keeps scores strictly above the radius; widen it so ">= threshold" still holds
+_RANGE_SEARCH_EPS = 1e-6
+_ENCODE_BATCH_SIZE = 64
+_EMB_CACHE_MAX = 50000
 _model = None
+#LRU of text -> embedding row, so re-running on the same document skips the model
+_emb_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+def _disk_key(backend: str, text: str) -> bytes:
+    #Backends produce slightly different vectors, so the backend is part of the key
+    return cache.make_key(b"emb", MODEL_NAME.encode(), backend.encode(), text.encode("utf-8"))
+
+def _load_from_disk(texts: List[str], backend: str) -> List[str]:
+    #Fill _emb_cache from the disk cache; returns the texts still missing
+    keys = {t: _disk_key(backend, t) for t in texts}
+    stored = cache.get_many(keys.values())
+    for t in texts:
+        if keys[t] in stored:
+            _emb_cache[t] = np.frombuffer(stored[keys[t]], dtype=np.float32)
+    return [t for t in texts if t not in _emb_cache]
+
+class OnnxInt8Encoder:
+    """
+    Dynamic int8-quantized ONNX export of the sentence-transformers model, run via onnxruntime.
+    Exposes the subset of the SentenceTransformer API used here (encode, embedding dimension).
+    """
+    _REQUIRED_FILES = ("model_quantized.onnx", "config.json", "tokenizer_config.json")
+
+    def __init__(self, cache_dir: str=ONNX_CACHE_DIR):
+        if not self._is_complete(cache_dir):
+            self._export(cache_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(cache_dir, file_name="model_quantized.onnx")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.config.hidden_size
+
+    @classmethod
+    def _is_complete(cls, cache_dir: str) -> bool:
+        return all(os.path.exists(os.path.join(cache_dir, f)) for f in cls._REQUIRED_FILES)
+
+    @classmethod
+    def _export(cls, cache_dir: str):
+        #Build in a sibling temp dir and rename it into place, so an interrupted export
+        #never leaves a half-written cache_dir that later runs would treat as valid
+        parent = os.path.dirname(cache_dir)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + ".", dir=parent)
+        try:
+            fp32 = ORTModelForFeatureExtraction.from_pretrained(HF_MODEL_ID, export=True)
+            quantizer = ORTQuantizer.from_pretrained(fp32)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=tmp_dir, quantization_config=qconfig)
+            fp32.config.save_pretrained(tmp_dir)
+            AutoTokenizer.from_pretrained(HF_MODEL_ID).save_pretrained(tmp_dir)
+            if os.path.isdir(cache_dir) and not cls._is_complete(cache_dir):
+                #Left behind by an export from before this was atomic
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            try:
+                os.replace(tmp_dir, cache_dir)
+            except OSError:
+                #Another process finished its export first
+                if not cls._is_complete(cache_dir):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def encode(self, texts: List[str], batch_size: int=32, **kwargs) -> np.ndarray:
+        out = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                   max_length=256, return_tensors="np")
+            hidden = self.model(**batch).last_hidden_state
+            #Mean-pool over real tokens, then L2-normalize like the sentence-transformers pipeline
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32, copy=False))
+        if not out:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.concatenate(out)
+
+def _backend_name() -> str:
+    #The backend get_model() picked, or will try first, without loading a model
+    if _model is not None:
+        return type(_model).__name__
+    if ORTModelForFeatureExtraction is not None:
+        return OnnxInt8Encoder.__name__
+    return SentenceTransformer.__name__
 
 def get_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer(MODEL_NAME)
+        if ORTModelForFeatureExtraction is not None:
+            try:
+                _model = OnnxInt8Encoder()
+            except Exception:
+                #Export/quantization can fail offline or on odd platforms; use PyTorch instead
+                _model = None
+        if _model is None:
+            _model = SentenceTransformer(MODEL_NAME)
     return _model
 
 def embed_texts(texts: List[str]):
-    m = get_model()
-    return m.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+    """
+    Embed texts, encoding only those not already cached (in memory, then on disk).
+    Misses are length-sorted before batching so each batch pads to a similar length.
+    """
+    missing = list(dict.fromkeys(t for t in texts if t not in _emb_cache))
+    #The model is only loaded if something is missing from both caches
+    backend = _backend_name()
+    missing = _load_from_disk(missing, backend)
+    if missing:
+        m = get_model()
+        if type(m).__name__ != backend:
+            #get_model fell back to another backend, whose vectors live under other keys
+            backend = type(m).__name__
+            missing = _load_from_disk(missing, backend)
+    if missing:
+        missing.sort(key=len)
+        embs = m.encode(missing, batch_size=_ENCODE_BATCH_SIZE,
+                        show_progress_bar=False, convert_to_numpy=True).astype(np.float32, copy=False)
+        for t, e in zip(missing, embs):
+            _emb_cache[t] = e
+        cache.put_many({_disk_key(backend, t): e.tobytes() for t, e in zip(missing, embs)})
+    out = []
+    for t in texts:
+        _emb_cache.move_to_end(t)
+        out.append(_emb_cache[t])
+    while len(_emb_cache) > _EMB_CACHE_MAX:
+        _emb_cache.popitem(last=False)
+    if not out:
+        return np.empty((0, get_model().get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.stack(out)
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _numba_cluster_labels(embs_norm, threshold):
+        """
+        Greedy clustering without materialising any similarity block: label[j] is the
+        index of the seed entity whose cluster j joined. Rows of already-clustered
+        entities are never computed.
+        """
+        n, d = embs_norm.shape
+        labels = np.full(n, -1, np.int64)
+        for i in range(n):
+            if labels[i] >= 0:
+                continue
+            labels[i] = i
+            for j in prange(i + 1, n):
+                if labels[j] >= 0:
+                    continue
+                s = 0.0
+                for k in range(d):
+                    s += embs_norm[i, k] * embs_norm[j, k]
+                if s >= threshold:
+                    labels[j] = i
+        return labels
+
+    #Compile at import so the first Streamlit run isn't penalised
+    _numba_cluster_labels(np.zeros((2, 384), dtype=np.float32), 0.5)
+
+def _reps_from_labels(entity_texts: List[str], lengths: np.ndarray, labels: np.ndarray) -> List[str]:
+    #Longest mention per cluster (earliest on ties), clusters in first-seen order
+    n = len(labels)
+    order = np.lexsort((np.arange(n), -lengths, labels))
+    first = np.ones(n, dtype=np.bool_)
+    first[1:] = labels[order][1:] != labels[order][:-1]
+    best = order[first]
+    _, first_seen = np.unique(labels, return_index=True)
+    return [entity_texts[i] for i in best[np.argsort(first_seen)]]
+
+def _faiss_cluster_labels(embs_norm: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Connected components of the "cosine >= threshold" neighbour graph.
+    Uses exact range search for moderate n and HNSW k-NN search for very large n.
+    The range-search radius is lowered by _RANGE_SEARCH_EPS to match the inclusive threshold.
+    """
+    n, d = embs_norm.shape
+    if n >= _HNSW_MIN_ENTITIES:
+        index = faiss.IndexHNSWFlat(d, _HNSW_NEIGHBOURS, faiss.METRIC_INNER_PRODUCT)
+        index.add(embs_norm)
+        D, I = index.search(embs_norm, min(n, _HNSW_NEIGHBOURS))
+        keep = (I >= 0) & (D >= threshold)
+        rows = np.repeat(np.arange(n), keep.sum(axis=1))
+        cols = I[keep]
+    else:
+        index = faiss.IndexFlatIP(d)
+        index.add(embs_norm)
+        lims, _, I = index.range_search(embs_norm, threshold - _RANGE_SEARCH_EPS)
+        #faiss returns lims/I as unsigned or platform ints; np.repeat needs int64 counts
+        rows = np.repeat(np.arange(n), np.diff(lims).astype(np.int64))
+        cols = I.astype(np.int64)
+    graph = csr_matrix((np.ones(len(rows), dtype=np.bool_), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels
 
-def deduplicate_entities(entity_texts: List[str], threshold: float=0.75) -> List[str]:
+def deduplicate_entities(entity_texts: List[str], threshold: float=0.75, method: str="auto") -> List[str]:
     """
     Cluster by cosine similarity threshold (greedy) and return a representative string per cluster.
     Representative chosen as the longest mention in cluster.
+    Similarities are computed one row-block at a time with a single matrix product per block.
+    For large inputs with faiss available, clusters are instead the connected components of
+    the thresholded neighbour graph (transitive rather than greedy).
+    method="numba" opts into a compiled version of the same greedy loop that
+    needs no similarity matrix at all; it requires numba.
     """
+    if method not in ("auto", "numba"):
+        raise ValueError(f"Unknown deduplication method: {method}")
+    if method == "numba" and njit is None:
+        raise RuntimeError("method='numba' requires numba to be installed")
     if not entity_texts:
         return []
-    embs = embed_texts(entity_texts)
-    norms = np.linalg.norm(embs, axis=1, keepdims=True)
+    #embed_texts returns a fresh array, so normalize it in place
+    embs_norm = embed_texts(entity_texts).astype(np.float32, copy=False)
+    norms = np.linalg.norm(embs_norm, axis=1, keepdims=True)
     norms[norms == 0] = 1e-9
-    embs_norm = embs / norms
+    embs_norm /= norms
     n = len(embs_norm)
-    visited = set()
-    clusters = []
-    for i in range(n):
-        if i in visited:
-            continue
-        cluster = [i]
-        visited.add(i)
-        for j in range(i+1, n):
-            if j in visited:
+    lengths = np.fromiter((len(t) for t in entity_texts), dtype=np.int64, count=n)
+    if method == "numba":
+        labels = _numba_cluster_labels(np.ascontiguousarray(embs_norm), float(threshold))
+        return _reps_from_labels(entity_texts, lengths, labels)
+    if faiss is not None and n >= _FAISS_MIN_ENTITIES:
+        labels = _faiss_cluster_labels(np.ascontiguousarray(embs_norm), threshold)
+        return _reps_from_labels(entity_texts, lengths, labels)
+    visited = np.zeros(n, dtype=np.bool_)
+    #Cap the similarity block at roughly _SIM_BLOCK_BYTES of float32
+    block = max(1, min(n, _SIM_BLOCK_BYTES // (4 * n)))
+    reps = []
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        sims = embs_norm[start:stop] @ embs_norm.T
+        for i in range(start, stop):
+            if visited[i]:
                 continue
-            cos = float(np.dot(embs_norm[i], embs_norm[j]))
-            if cos >= threshold:
-                cluster.append(j)
-                visited.add(j)
-        clusters.append(cluster)
-    reps = [max([entity_texts[i] for i in c], key=len) for c in clusters]
-    return reps
\ No newline at end of file
+            row = sims[i - start]
+            members = np.flatnonzero((row >= threshold) & ~visited)
+            members = np.concatenate(([i], members[members > i]))
+            visited[members] = True
+            reps.append(entity_texts[members[np.argmax(lengths[members])]])
+    return reps
@@ -3,28 +3,117 @@ graph_builder.py
 
 Create a NetworkX graph from triplets and provide basic aggregation behaviour.
 """
+import bisect
+import functools
 import networkx as nx
-from typing import List, Tuple
+import pandas as pd
+from typing import Callable, List, Tuple, Union
 
-def build_graph_from_triplets(triplets: List[Tuple[str, str, str]]) -> nx.DiGraph:
+TRIPLET_COLUMNS = ["subject", "predicate", "object"]
+
+try:
+    import ahocorasick
+except Exception:
+    #pyahocorasick is optional; substring lookup falls back to a scan over reps
+    ahocorasick = None
+
+def make_normalizer(reps: List[str]) -> Callable[[str], str]:
+    """
+    Build a function mapping an entity mention to its representative from reps.
+    Exact (case-insensitive) matches win; otherwise the first rep (in reps order)
+    that contains the mention or is contained in it; otherwise the mention itself.
+    """
+    lowered = [r.lower() for r in reps]
+    exact = {}
+    for r, low in zip(reps, lowered):
+        exact.setdefault(low, r)
+    #Mention-in-rep: one C-level find over all reps joined by a separator
+    joined = "\x00".join(lowered)
+    starts = []
+    pos = 0
+    for low in lowered:
+        starts.append(pos)
+        pos += len(low) + 1
+    #Rep-in-mention: Aho-Corasick automaton over the reps
+    automaton = None
+    if ahocorasick is not None and reps:
+        automaton = ahocorasick.Automaton()
+        for i, low in enumerate(lowered):
+            if low and low not in automaton:
+                automaton.add_word(low, i)
+        automaton.make_automaton()
+    #An empty rep is contained in every mention, so no later rep can win past it
+    no_match = lowered.index("") if "" in exact else len(reps)
+
+    @functools.lru_cache(maxsize=None)
+    def normalize(e: str) -> str:
+        low = e.lower()
+        if low in exact:
+            return exact[low]
+        best = no_match
+        hit = joined.find(low)
+        if hit >= 0:
+            best = min(best, bisect.bisect_right(starts, hit) - 1)
+        if automaton is not None:
+            for _, i in automaton.iter(low):
+                best = min(best, i)
+        else:
+            for i, r in enumerate(lowered[:best]):
+                if r in low:
+                    best = i
+                    break
+        return reps[best] if best < len(reps) else e
+
+    return normalize
+
+def normalize_triplets(triplets: List[Tuple[str, str, str]], reps: List[str]) -> List[Tuple[str, str, str]]:
     """
-    triplets: list of (subject, predicate, object)
+    Map subjects/objects onto their representative mention; drops triplets missing either.
+    """
+    normalize = make_normalizer(reps)
+    return [(normalize(s), p, normalize(o)) for (s, p, o) in triplets if s and o]
+
+def normalize_triplets_frame(triplets: List[Tuple[str, str, str]], reps: List[str]) -> pd.DataFrame:
+    """
+    Column-wise normalize_triplets: returns a subject/predicate/object DataFrame.
+    Each distinct subject/object string is normalized once and mapped back onto the column.
+    """
+    df = pd.DataFrame.from_records(triplets, columns=TRIPLET_COLUMNS)
+    keep = df["subject"].str.len().gt(0) & df["object"].str.len().gt(0)
+    df = df[keep].reset_index(drop=True)
+    normalize = make_normalizer(reps)
+    for col in ("subject", "object"):
+        uniq = pd.unique(df[col])
+        df[col] = df[col].map(dict(zip(uniq, map(normalize, uniq))))
+    return df
+
+def build_graph_from_triplets(triplets: Union[List[Tuple[str, str, str]], pd.DataFrame]) -> nx.DiGraph:
+    """
+    triplets: list of (subject, predicate, object), or a DataFrame with those columns
     Aggregates edge 'weight' and set of predicates per edge.
     """
-    G = nx.DiGraph()
+    if isinstance(triplets, pd.DataFrame):
+        triplets = zip(*(triplets[c] for c in TRIPLET_COLUMNS))
+    #Aggregate in plain dicts first, then hand NetworkX everything in two bulk calls.
+    #Dicts keep first-seen order for nodes, edges and predicates.
+    nodes = {}
+    edges = {}
     for s, p, o in triplets:
         if s is None or o is None:
             continue
-        if not G.has_node(s):
-            G.add_node(s, label=s, type="entity")
-        if not G.has_node(o):
-            G.add_node(o, label=o, type="entity")
-        if G.has_edge(s,o):
-            G[s][o]["weight"] += 1
-            G[s][o]["preds"].add(p)
+        nodes[s] = None
+        nodes[o] = None
+        e = edges.get((s, o))
+        if e is None:
+            edges[(s, o)] = [1, {p: None}]
         else:
-            G.add_edge(s, o, label=p, weight=1, preds={p})
-    #Convert preds set to list for serialization convenience
-    for u, v, data in G.edges(data=True):
-        data["preds"] = list(data.get("preds", []))
+            e[0] += 1
+            e[1][p] = None
+    G = nx.DiGraph()
+    G.add_nodes_from((n, {"label": n, "type": "entity"}) for n in nodes)
+    #label is the first predicate seen; preds is a list for serialization convenience
+    G.add_edges_from(
+        (s, o, {"label": next(iter(preds)), "weight": weight, "preds": list(preds)})
+        for (s, o), (weight, preds) in edges.items()
+    )
     return G
\ No newline at end of file
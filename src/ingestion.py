@@ -5,37 +5,117 @@ Provides extract_text_from_pdf which accepts either:
 - raw PDF bytes, or
 - filesystem path to a PDF.
 
-Returns a list of dicts: [{"page_num": int, "text": str}, ...].
+Returns a list of dicts: [{"page_num": int, "text": str, "ocr": bool}, ...],
+where "ocr" marks pages whose (non-empty) text came from tesseract.
 """
-from typing import List, Dict, Union
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import fitz
 from PIL import Image
-import io
+import json
+import os
 import pytesseract
+import threading
+
+from src import cache
+
+#OMP_THREAD_LIMIT is process-wide, and Streamlit runs each session on its own thread,
+#so concurrent OCR calls share one reference-counted setting under a lock.
+_omp_lock = threading.Lock()
+_omp_users = 0
+_omp_owned = False
 
 def open_pdf(path_or_bytes: Union[str, bytes]):
     if isinstance(path_or_bytes, (bytes, bytearray)):
         return fitz.open(stream=path_or_bytes, filetype="pdf")
     return fitz.open(path_or_bytes)
 
+#Raw 8-bit grayscale page render: (width, height, samples)
+RawImage = Tuple[int, int, bytes]
+
+def _render_page(page, dpi: int) -> RawImage:
+    #Tesseract binarizes internally, so a grayscale render loses nothing and is 3x smaller.
+    #The raw samples buffer is used directly, skipping a PNG encode/decode round trip.
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return pix.width, pix.height, pix.samples
+
+def _ocr_image(raw: RawImage) -> Optional[str]:
+    #pytesseract runs the tesseract binary as a subprocess and waits with the GIL released,
+    #so worker threads give one tesseract process per page in parallel.
+    #Returns None when OCR itself failed (e.g. tesseract missing) so the result isn't cached.
+    width, height, samples = raw
+    try:
+        return pytesseract.image_to_string(Image.frombytes("L", (width, height), samples))
+    except Exception:
+        return None
+
+@contextmanager
+def _single_threaded_tesseract() -> Iterator[None]:
+    """
+    Tesseract multithreads each page with OpenMP; with one process per core that would
+    oversubscribe the CPU, so tesseract subprocesses started while any caller is inside
+    this block get OMP_THREAD_LIMIT=1. The variable is set by the first caller and removed
+    by the last one; a limit the user set themselves is never touched. It is not set at
+    import time because torch's OpenMP pool in this process would pick it up too.
+    """
+    global _omp_users, _omp_owned
+    with _omp_lock:
+        if _omp_users == 0 and "OMP_THREAD_LIMIT" not in os.environ:
+            os.environ["OMP_THREAD_LIMIT"] = "1"
+            _omp_owned = True
+        _omp_users += 1
+    try:
+        yield
+    finally:
+        with _omp_lock:
+            _omp_users -= 1
+            if _omp_users == 0 and _omp_owned:
+                os.environ.pop("OMP_THREAD_LIMIT", None)
+                _omp_owned = False
+
+def _ocr_pages(images: List[RawImage]) -> List[Optional[str]]:
+    if len(images) <= 1:
+        return [_ocr_image(img) for img in images]
+    with _single_threaded_tesseract():
+        workers = min(len(images), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_ocr_image, images))
+
 def extract_text_from_pdf(path_or_bytes: Union[str, bytes],
                           ocr_if_needed: bool = True,
                           dpi: int=200) -> List[Dict]:
     #Extract text from each page of a PDF. Accepts bytes or filepath.
-    doc = open_pdf(path_or_bytes)
+    #Pages without a text layer are rendered first, then OCR'd concurrently.
+    #Results are cached by a hash of the PDF bytes and the OCR settings.
+    if isinstance(path_or_bytes, (bytes, bytearray)):
+        pdf_bytes = bytes(path_or_bytes)
+    else:
+        with open(path_or_bytes, "rb") as fh:
+            pdf_bytes = fh.read()
+    key = cache.make_key(b"pages-v3", pdf_bytes, str(bool(ocr_if_needed)).encode(), str(dpi).encode())
+    hit = cache.get(key)
+    if hit is not None:
+        return json.loads(hit)
+
+    doc = open_pdf(pdf_bytes)
     pages = []
+    ocr_idx, ocr_images = [], []
     for i, page in enumerate(doc, start=1):
         try:
             text = page.get_text().strip()
         except Exception:
             text = ""
         if not text and ocr_if_needed:
-            pix = page.get_pixmap(dpi=dpi)
-            img = Image.open(io.BytesIO(pix.tobytes()))
-            try:
-                text = pytesseract.image_to_string(img)
-            except Exception:
-                text = ""
-        pages.append({"page_num": i, "text": text})
+            ocr_idx.append(len(pages))
+            ocr_images.append(_render_page(page, dpi))
+        pages.append({"page_num": i, "text": text, "ocr": False})
     doc.close()
+    ocr_failed = False
+    for idx, text in zip(ocr_idx, _ocr_pages(ocr_images)):
+        ocr_failed = ocr_failed or text is None
+        pages[idx]["text"] = text or ""
+        pages[idx]["ocr"] = bool(text and text.strip())
+    if not ocr_failed:
+        cache.put(key, json.dumps(pages).encode("utf-8"))
     return pages
@@ -2,38 +2,170 @@
 nlp_pipeline.py
 
 Provides:
-- extract_entities_with_spans(text)
-- extract_relations_from_sentence(sentence)
-- naive_coref_resolution(sentences)
+- load_model(name) / select_model(total_chars, num_pages, ocr_pages)
+- split_sentence_docs(texts, nlp)
+- parse_sentences(sentences, docs, nlp)
+- extract_entities_with_spans(text) / extract_entities_from_doc(doc)
+- extract_relations_from_sentence(sentence) / extract_relations_from_doc(doc)
+- extract_from_doc(doc) -> (entities, relations) in one pass
+- naive_coref_resolution(sentences) / naive_coref_resolution_docs(docs)
 """
 
-from typing import List, Tuple, Dict
+from typing import Iterable, Iterator, List, Tuple, Dict, Optional
+import os
 import re
 
 import spacy
+from spacy.attrs import SPACY
+from spacy.language import Language
 from spacy.matcher import Matcher
+from spacy.tokens import Doc
+from spacy.vocab import Vocab
+
+from src.preprocess import clean_text
+
+TRF_MODEL = "en_core_web_trf"
+SM_MODEL = "en_core_web_sm"
+#Documents above either size are routed to the small model
+LARGE_DOC_CHARS = 100_000
+LARGE_DOC_PAGES = 50
+#...or when at least this share of pages had their text from OCR
+OCR_PAGE_SHARE = 0.5
+
+_models: Dict[str, Language] = {}
+
+def load_model(name: str) -> Language:
+    #Loaded once per process and reused
+    if name not in _models:
+        _models[name] = spacy.load(name)
+    return _models[name]
 
 try:
-    nlp = spacy.load("en_core_web_trf")
+    nlp = load_model(TRF_MODEL)
 except Exception:
-    nlp = spacy.load("en_core_web_sm")
+    nlp = load_model(SM_MODEL)
+
+def select_model(total_chars: int, num_pages: int, ocr_pages: int=0) -> Language:
+    """
+    Pick the spaCy pipeline for a document. Long documents and mostly-OCR'd ones (noisy anyway)
+    use en_core_web_sm, which is an order of magnitude faster than the transformer model.
+    A few scanned pages (e.g. a cover) in a born-digital document don't trigger the switch.
+    """
+    mostly_ocr = num_pages > 0 and ocr_pages / num_pages >= OCR_PAGE_SHARE
+    if mostly_ocr or num_pages > LARGE_DOC_PAGES or total_chars >= LARGE_DOC_CHARS:
+        try:
+            return load_model(SM_MODEL)
+        except Exception:
+            pass
+    return nlp
 
-matcher = Matcher(nlp.vocab)
 pattern_of = [
     [{"ENT_TYPE": {"NOT_IN": [""]}, "OP": "+"},
      {"LOWER": "of"},
      {"ENT_TYPE": {"NOT_IN": [""]}, "OP": "+"}]
 ]
-try:
-    matcher.add("OF_PATTERN", pattern_of)
-except Exception:
-    #if pattern fails due to model differences, ignore
-    pass
+_matchers: Dict[int, Matcher] = {}
+
+def _get_matcher(vocab: Vocab) -> Matcher:
+    #One matcher per loaded model vocab
+    key = id(vocab)
+    if key not in _matchers:
+        m = Matcher(vocab)
+        try:
+            m.add("OF_PATTERN", pattern_of)
+        except Exception:
+            #if pattern fails due to model differences, ignore
+            pass
+        _matchers[key] = m
+    return _matchers[key]
+
+matcher = _get_matcher(nlp.vocab)
 
 PRONOUNS = set(["he", "she", "they", "it", "his", "her", "their", "its"])
+_PRONOUN_RE = re.compile(r"\b(" + "|".join(sorted(PRONOUNS)) + r")\b", re.IGNORECASE)
+PIPE_BATCH_SIZE = 32
+CPU_PIPE_BATCH_SIZE = 64
+PAGE_BATCH_SIZE = 4
+#Opt-in worker processes for nlp.pipe on CPU pipelines (default 1 = in-process)
+SPACY_PROCESSES_ENV = "KG_SPACY_PROCESSES"
+#Below these workloads worker startup costs more than the parse saves
+MULTIPROCESS_MIN_PAGES = 100
+MULTIPROCESS_MIN_SENTENCES = 3000
+
+def _requested_processes() -> int:
+    try:
+        return max(1, int(os.environ.get(SPACY_PROCESSES_ENV, "1")))
+    except ValueError:
+        return 1
+
+def _pipe(nlp: Language, texts: Iterable[str], count: int, batch_size: int, min_items: int) -> Iterator[Doc]:
+    """
+    nlp.pipe, optionally with worker processes for CPU pipelines (e.g. en_core_web_sm).
+    Multiprocessing is opt-in via KG_SPACY_PROCESSES and only used for workloads of at
+    least min_items, since it forks the (multithreaded) server process. Transformer
+    pipelines always stay single-process: they already batch through torch.
+    """
+    n_process = 1
+    requested = _requested_processes()
+    if requested > 1 and count >= min_items and "transformer" not in nlp.pipe_names:
+        n_process = max(1, min(requested, count // batch_size))
+    return nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+
+def _sentence_batch_size(nlp: Language) -> int:
+    return PIPE_BATCH_SIZE if "transformer" in nlp.pipe_names else CPU_PIPE_BATCH_SIZE
+
+def _trimmed_sentence_doc(sent) -> Doc:
+    """
+    sent.as_doc() without leading/trailing whitespace: drops newline/space tokens at
+    either end and the trailing space after the last token, so doc.text is stripped.
+    """
+    doc = sent.doc
+    start, end = sent.start, sent.end
+    while start < end and doc[start].is_space:
+        start += 1
+    while end > start and doc[end - 1].is_space:
+        end -= 1
+    sent_doc = doc[start:end].as_doc()
+    if len(sent_doc) and sent_doc[-1].whitespace_:
+        spaces = sent_doc.to_array([SPACY])
+        spaces[-1] = 0
+        sent_doc.from_array([SPACY], spaces)
+    return sent_doc
+
+def split_sentence_docs(texts: List[str], nlp: Language=nlp) -> List[Doc]:
+    """
+    Parse whole page texts in one batched pass and split them into per-sentence Docs
+    using the parser's sentence boundaries. The sentence Docs keep their entities and
+    dependency parse, so they do not need to be parsed again.
+    """
+    out = []
+    for doc in _pipe(nlp, (clean_text(t) for t in texts), len(texts), PAGE_BATCH_SIZE,
+                     MULTIPROCESS_MIN_PAGES):
+        for sent in doc.sents:
+            if len(sent.text.strip()) > 3:
+                out.append(_trimmed_sentence_doc(sent))
+    return out
+
+def parse_sentences(sentences: List[str], docs: Optional[List[Doc]]=None, nlp: Language=nlp) -> List[Doc]:
+    """
+    Parse sentences with a single batched nlp.pipe call.
+    If docs (parsed from an earlier version of the same sentences) is given, only
+    sentences whose text changed are re-parsed; the rest reuse the existing Doc.
+    """
+    batch_size = _sentence_batch_size(nlp)
+    if docs is None:
+        return list(_pipe(nlp, sentences, len(sentences), batch_size, MULTIPROCESS_MIN_SENTENCES))
+    out = list(docs)
+    changed = [i for i, (s, d) in enumerate(zip(sentences, docs)) if s != d.text]
+    reparsed = _pipe(nlp, (sentences[i] for i in changed), len(changed), batch_size, MULTIPROCESS_MIN_SENTENCES)
+    for i, doc in zip(changed, reparsed):
+        out[i] = doc
+    return out
 
 def extract_entities_with_spans(text: str) -> List[Dict]:
-    doc = nlp(text)
+    return extract_entities_from_doc(nlp(text))
+
+def extract_entities_from_doc(doc: Doc) -> List[Dict]:
     return[
         {"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char}
         for ent in doc.ents
@@ -46,11 +178,23 @@ def extract_relations_from_sentence(sentence: str) -> List[Tuple[str, str, str]]
      - uses dependency parse to find verb connecting subj and obj
      - fallback: link sequential entities with related_to
     """
-    doc = nlp(sentence)
+    return extract_relations_from_doc(nlp(sentence))
+
+def extract_relations_from_doc(doc: Doc) -> List[Tuple[str, str, str]]:
+    return _relations_from_doc(doc, [ent.text for ent in doc.ents])
+
+def extract_from_doc(doc: Doc) -> Tuple[List[Dict], List[Tuple[str, str, str]]]:
+    """
+    Entities and relations for one parsed sentence, walking doc.ents only once.
+    """
+    entities = extract_entities_from_doc(doc)
+    return entities, _relations_from_doc(doc, [e["text"] for e in entities])
+
+def _relations_from_doc(doc: Doc, ents: List[str]) -> List[Tuple[str, str, str]]:
     relations = []
 
     #1) matcher "X of Y"
-    for match_id, start, end in matcher(doc):
+    for match_id, start, end in _get_matcher(doc.vocab)(doc):
         span = doc[start:end]
         text = span.text
         if " of " in text:
@@ -69,7 +213,6 @@ def extract_relations_from_sentence(sentence: str) -> List[Tuple[str, str, str]]
                     relations.append((subj_text, token.lemma_, obj_phrase))
 
     #3) Fallback: If Sentence has 2 or more entities, link them sequentially
-    ents = [ent.text for ent in doc.ents]
     if len(ents) >= 2:
         for i in range(len(ents) - 1):
             relations.append((ents[i], "related_to", ents[i+1]))
@@ -89,17 +232,20 @@ def naive_coref_resolution(sentences: List[str]) -> List[str]:
     Very naive coreference: replace pronouns with the most recent PERSON/ORG/GPE mention.
     This is a lightweight heuristic to improve RE for MVP.
     """
+    return naive_coref_resolution_docs(parse_sentences(sentences))
+
+def naive_coref_resolution_docs(docs: List[Doc]) -> List[str]:
+    """
+    Same as naive_coref_resolution, but over already-parsed Docs.
+    """
     resolved = []
     last_entity = None
-    for sent in sentences:
-        doc = nlp(sent)
-        ents = [ent.text for ent in doc.ents if ent.label_ in ("PERSON", "ORG", "GPR", "NORP", "PRODUCT")]
+    for doc in docs:
+        sent = doc.text
+        ents = [ent.text for ent in doc.ents if ent.label_ in ("PERSON", "ORG", "GPE", "NORP", "PRODUCT")]
         if ents:
-            last_entity = ents[-1]
-        def repl(m):
-            if last_entity:
-                return last_entity
-            return m.group(0)
-        sent2 = re.sub(r"\b(" + "|".join(PRONOUNS) + r")\b", repl, sent, flags=re.IGNORECASE)
+            #Escape backslashes so the entity is used literally as the replacement
+            last_entity = ents[-1].replace("\\", "\\\\")
+        sent2 = _PRONOUN_RE.sub(last_entity, sent) if last_entity else sent
         resolved.append(sent2)
     return resolved
\ No newline at end of file
@@ -2,63 +2,36 @@
 preprocess.py
 
 Text cleaning and sentence splitting utilities.
+The app segments sentences with spaCy (see nlp_pipeline.split_sentence_docs);
+split_sentences here is a lightweight regex splitter for callers without a model.
 """
 import re
 from typing import List
-import nltk
 
-def _ensure_punkt() -> bool:
-    """
-    Try to ensure the NLTK 'punkt' tokenizer is available.
-    Returns True when punkt is available, False otherwise.
-    """
-    try:
-        nltk.data.find("tokenizers/punkt")
-        return True
-    except LookupError:
-        pass
-    try:
-        # attempt to download quietly
-        nltk.download("punkt", quiet=True)
-        nltk.data.find("tokenizers/punkt")
-        return True
-    except Exception:
-        return False
-
-_PUNKT_AVAILABLE = _ensure_punkt()
-
-from nltk.tokenize import sent_tokenize
+_NEWLINES_RE = re.compile(r"\n{2,}")
+#Runs of spaces/tabs and non-printable characters collapse to a single space in one pass:
+#everything except newlines and visible ASCII (\x21-\x7E) is treated as "space"
+_SPACE_RE = re.compile(r"[^\x0A\x0D\x21-\x7E]+")
+_SENT_END_RE = re.compile(r'(?<=[\.\?\!])\s+')
 
 def clean_text(text:str) -> str:
     #Normalize newlines and whitespace, remove non-printable unicode
     text = text.replace("\r", "\n")
-    text = re.sub(r"\n{2,}", "\n\n", text)
-    # remove non-ascii control characters but keep common punctuation
-    text = re.sub(r"[^\x09\x0A\x0D\x20-\x7E]+", " ", text)
-    text = re.sub(r"[ \t]+", " ", text)
+    text = _NEWLINES_RE.sub("\n\n", text)
+    # remove non-ascii control characters but keep common punctuation; squeeze spaces/tabs
+    text = _SPACE_RE.sub(" ", text)
     return text.strip()
 
 def split_sentences(text:str) -> List[str]:
     text = clean_text(text)
-    if _PUNKT_AVAILABLE:
-        try:
-            sents = sent_tokenize(text)
-        except LookupError:
-            # fall back if punkt is somehow missing at runtime
-            _ = _ensure_punkt()
-            try:
-                sents = sent_tokenize(text)
-            except Exception:
-                sents = _simple_sent_split(text)
-    else:
-        sents = _simple_sent_split(text)
+    sents = _simple_sent_split(text)
     return [s.strip() for s in sents if len(s.strip()) > 3]
 
 def _simple_sent_split(text: str) -> List[str]:
     """
-    Lightweight fallback sentence splitter when NLTK punkt is unavailable.
-    Not as accurate as punkt, but robust for basic text.
+    Lightweight regex sentence splitter.
+    Not as accurate as a trained segmenter, but robust for basic text.
     """
     # Split on sentence end punctuation followed by space/newline
-    parts = re.split(r'(?<=[\.\?\!])\s+', text)
+    parts = _SENT_END_RE.split(text)
     return [p for p in parts if p.strip()]
\ No newline at end of file
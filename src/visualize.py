@@ -7,10 +7,9 @@ from pyvis.network import Network
 import networkx as nx
 import tempfile
 
-def nx_to_pyvis(G: nx.Graph, height: str="700px", width: str="100%") -> str:
+def nx_to_pyvis_html(G: nx.Graph, height: str="700px", width: str="100%") -> str:
     """
-    Returns path to a generated HTML file containing the pyvis visualization.
-    Caller should remove the file when done.
+    Returns the pyvis visualization as an HTML string (no file I/O).
     """
     net = Network(height=height, width=width, notebook=False)
     net.from_nx(G)
@@ -27,9 +26,8 @@ def nx_to_pyvis(G: nx.Graph, height: str="700px", width: str="100%") -> str:
       }
     }
     """)
-    tmp = tempfile.NamedTemporaryFile(suffix=".html", delete=False)
     try:
-        net.write_html(tmp.name)
+        return net.generate_html(notebook=False)
     except AttributeError as e:
         # template.render() failed: template is None (missing Jinja2 or pyvis templates)
         raise RuntimeError(
@@ -39,4 +37,13 @@ def nx_to_pyvis(G: nx.Graph, height: str="700px", width: str="100%") -> str:
             "  pip install --force-reinstall pyvis jinja2\n\n"
             "Then restart the app."
         ) from e
+
+def nx_to_pyvis(G: nx.Graph, height: str="700px", width: str="100%") -> str:
+    """
+    Returns path to a generated HTML file containing the pyvis visualization.
+    Caller should remove the file when done.
+    """
+    html = nx_to_pyvis_html(G, height=height, width=width)
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as tmp:
+        tmp.write(html)
     return tmp.name
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Regression checks for deduplicate_entities in src/embeddings.py: the blocked
+and numba greedy paths against the original pairwise loop, and the FAISS path.
+"""
+import sys
+import types
+
+import numpy as np
+import pytest
+
+#Embeddings are monkeypatched below, so the model library itself is never used
+try:
+    import sentence_transformers  # noqa: F401
+except ImportError:
+    _stub = types.ModuleType("sentence_transformers")
+    _stub.SentenceTransformer = None
+    sys.modules["sentence_transformers"] = _stub
+
+from src import embeddings
+
+
+def _reference_dedup(entity_texts, embs, threshold):
+    #The pre-vectorization greedy loop, kept verbatim as the oracle
+    norms = np.linalg.norm(embs, axis=1, keepdims=True)
+    norms[norms == 0] = 1e-9
+    embs_norm = embs / norms
+    n = len(embs_norm)
+    visited = set()
+    clusters = []
+    for i in range(n):
+        if i in visited:
+            continue
+        cluster = [i]
+        visited.add(i)
+        for j in range(i+1, n):
+            if j in visited:
+                continue
+            cos = float(np.dot(embs_norm[i], embs_norm[j]))
+            if cos >= threshold:
+                cluster.append(j)
+                visited.add(j)
+        clusters.append(cluster)
+    return [max([entity_texts[i] for i in c], key=len) for c in clusters]
+
+
+def _random_entities(seed, n=300):
+    #0/1 vectors in 8 dimensions: cosines are k/sqrt(a*b), never within rounding of 0.7
+    rng = np.random.default_rng(seed)
+    embs = rng.integers(0, 2, size=(n, 8)).astype(np.float32)
+    embs[rng.random(n) < 0.05] = 0
+    texts = ["e%d%s" % (i, "x" * int(rng.integers(0, 6))) for i in range(n)]
+    return texts, embs
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_blocked_path_matches_reference(monkeypatch, seed):
+    texts, embs = _random_entities(seed)
+    expected = _reference_dedup(texts, embs.copy(), 0.7)
+    monkeypatch.setattr(embeddings, "faiss", None)
+    monkeypatch.setattr(embeddings, "embed_texts", lambda t: embs.copy())
+    #Force several row blocks as well as the single-block case
+    for block_bytes in (4 * len(texts) * 7, embeddings._SIM_BLOCK_BYTES):
+        monkeypatch.setattr(embeddings, "_SIM_BLOCK_BYTES", block_bytes)
+        assert embeddings.deduplicate_entities(texts, threshold=0.7) == expected
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_numba_path_matches_reference(monkeypatch, seed):
+    pytest.importorskip("numba")
+    texts, embs = _random_entities(seed)
+    expected = _reference_dedup(texts, embs.copy(), 0.7)
+    monkeypatch.setattr(embeddings, "embed_texts", lambda t: embs.copy())
+    assert embeddings.deduplicate_entities(texts, threshold=0.7, method="numba") == expected
+
+
+def test_faiss_range_search_path(monkeypatch):
+    pytest.importorskip("faiss")
+    pytest.importorskip("scipy")
+    texts = ["Apple", "Apple Inc.", "Banana", "Cherry"]
+    vecs = np.array([
+        [1.0, 0.0, 0.0],
+        [0.8, 0.6, 0.0],  # cosine 0.8 with "Apple": exactly on the threshold
+        [0.0, 1.0, 0.0],
+        [0.0, 0.0, 1.0],
+    ], dtype=np.float32)
+    monkeypatch.setattr(embeddings, "_FAISS_MIN_ENTITIES", 1)
+    monkeypatch.setattr(embeddings, "embed_texts", lambda t: vecs.copy())
+    assert embeddings.deduplicate_entities(texts, threshold=0.8) == ["Apple Inc.", "Banana", "Cherry"]
@@ -0,0 +1,58 @@
+"""
+Checks make_normalizer in src/graph_builder.py against the original linear
+scan over the representatives, with and without pyahocorasick.
+"""
+import importlib
+import random
+import sys
+import types
+
+import pytest
+
+#Only make_normalizer is exercised, which needs neither networkx nor pandas
+for _name in ("networkx", "pandas"):
+    try:
+        importlib.import_module(_name)
+    except ImportError:
+        sys.modules[_name] = types.ModuleType(_name)
+        sys.modules[_name].DiGraph = sys.modules[_name].DataFrame = object
+
+from src import graph_builder
+
+
+def _reference_normalize(e, reps):
+    for r in reps:
+        if e.lower() in r.lower() or r.lower() in e.lower():
+            return r
+    return e
+
+
+def _random_words(rng, count):
+    return ["".join(rng.choice("abcAB") for _ in range(rng.randint(1, 5))) for _ in range(count)]
+
+
+def _check_against_reference(seed):
+    rng = random.Random(seed)
+    reps = _random_words(rng, 40) + ["", "Apple Inc.", "apple"]
+    rng.shuffle(reps)
+    normalize = graph_builder.make_normalizer(reps)
+    lowered = {r.lower() for r in reps}
+    mentions = _random_words(rng, 500) + ["APPLE INC", "Pineapple", "", "zzz"]
+    for e in mentions:
+        if e.lower() in lowered:
+            #Exact matches deliberately win over an earlier containing rep
+            assert normalize(e).lower() == e.lower()
+        else:
+            assert normalize(e) == _reference_normalize(e, reps), (e, reps)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_make_normalizer_matches_reference_scan(monkeypatch, seed):
+    monkeypatch.setattr(graph_builder, "ahocorasick", None)
+    _check_against_reference(seed)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_make_normalizer_matches_reference_ahocorasick(monkeypatch, seed):
+    monkeypatch.setattr(graph_builder, "ahocorasick", pytest.importorskip("ahocorasick"))
+    _check_against_reference(seed)
@@ -0,0 +1,40 @@
+"""
+Checks the single-pass clean_text in src/preprocess.py against the original
+four-pass implementation.
+"""
+import random
+import re
+
+import pytest
+
+from src.preprocess import clean_text
+
+
+def _reference_clean_text(text):
+    text = text.replace("\r", "\n")
+    text = re.sub(r"\n{2,}", "\n\n", text)
+    text = re.sub(r"[^\x09\x0A\x0D\x20-\x7E]+", " ", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    return text.strip()
+
+
+_ALPHABET = "ab .,\t\n\r\x00\x0b\x0c\x1f\x7f\xa0é–​\U0001F600"
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "  plain text  ",
+    "tabs\t\tand  spaces",
+    "line one\r\n\r\nline two\n\n\n\nthree",
+    "café – naïve\xa0text",
+    "\x00\x01control\x7f chars\t\n",
+])
+def test_clean_text_matches_reference_examples(text):
+    assert clean_text(text) == _reference_clean_text(text)
+
+
+def test_clean_text_matches_reference_random():
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 40)))
+        assert clean_text(text) == _reference_clean_text(text), repr(text)